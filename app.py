@@ -4,52 +4,393 @@ Hinweise für Leser:
 - App-Factory-Pattern mit global initialisierten Flask-Extensions.
 - Routen nutzen schlichtes Server-Side-Rendering; kein CSRF-Token-Setup (für Prod ergänzen).
 - Status-Lifecycle: Shipment: open -> shipped; Package: open -> packed -> (implizit) shipped.
-- Bestandsprüfung ist logisch korrekt, aber ohne transaktionale Sperren (Race Conditions möglich).
+- Bestandsprüfung sperrt die Stock-Zeile des Items (FOR UPDATE); Konkurrenz nur pro Item.
+- Reservierte Mengen offener Shipments liegen vorberechnet in open_reservation (von den Views gepflegt).
 """
 
+import hmac
+import time
 from datetime import datetime
-from flask import Flask, render_template, request, redirect, url_for, abort, jsonify, current_app
-from flask_sqlalchemy import SQLAlchemy
-from flask_migrate import Migrate
-from flask_login import (
-    LoginManager, login_user, login_required, logout_user, current_user
-)
+from functools import lru_cache
+from threading import Lock
+
+import orjson
+import redis
+from cachetools import TTLCache
+from sqlalchemy import lambda_stmt, bindparam, event
+from sqlalchemy.dialects import mysql, postgresql, sqlite
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Bundle, configure_mappers, load_only, raiseload, undefer
+from sqlalchemy.sql.lambdas import StatementLambdaElement
+from flask import Flask, request, redirect, url_for, abort, jsonify, stream_with_context, current_app
+from flask import before_render_template, template_rendered
+from flask_login import UserMixin, login_user, login_required, logout_user, current_user
 from flask import Blueprint
+from flask.json.provider import JSONProvider
 from config import Config
 
-# Globale Extensions – echte Instanzierung in create_app()
-db = SQLAlchemy()
-migrate = Migrate()
-login_manager = LoginManager()
+# Globale Extensions – echte Instanzierung in create_app(); liegen in extensions.py,
+# damit models.py sie ohne Zirkelimport nutzen kann.
+from extensions import db, migrate, login_manager
+
+# Modelle einmalig auf Modulebene (statt pro Request in jeder View) importieren.
+# Kurz-Aliase wie bisher in den Views.
+from models import (
+    User, ShipmentHead, PackageHead, ShipmentLine, Item, PackageLine, Stock, OpenReservation, InsufficientStock,
+    hash_password, verify_password, password_needs_rehash,
+)
+SH, PH, SL, PL, IT, ST = ShipmentHead, PackageHead, ShipmentLine, PackageLine, Item, Stock
+RV = OpenReservation
+
+# ------------ Vorbereitete Statements (heiße Pfade) ------------
+# lambda_stmt wird einmal beim Import gebaut; SQLAlchemy cached die kompilierte Form
+# anhand des Lambda-Codes, Werte kommen ausschließlich über bindparam() zur Laufzeit.
+# Login: nur die Spalten für Passwortprüfung + SessionUser (Row statt ORM-Objekt, damit cachebar)
+_USER_BY_NAME = lambda_stmt(
+    lambda: db.select(User.id, User.username, User.password_hash).where(User.username == bindparam("username"))
+)
+# Session-Rehydrierung (load_user): nur die Spalten des SessionUser
+_SESSION_USER = lambda_stmt(
+    lambda: db.select(User.id, User.username).where(User.id == bindparam("user_id"))
+)
+# Listen-Templates lesen nur Spalten: raiseload("*") macht versehentliche Lazy Loads (N+1) sofort sichtbar.
+# Shipment-Liste lädt zudem nur die angezeigten Spalten (raiseload=True: Zugriff auf andere knallt ebenfalls).
+_SHIPMENTS_LIST = lambda_stmt(
+    lambda: db.select(SH)
+      .options(load_only(SH.id, SH.status, SH.shipment_number, SH.created_at, raiseload=True), raiseload("*"))
+      .order_by(SH.id.desc())
+)
+_ITEMS_BY_ID = lambda_stmt(lambda: db.select(IT).options(raiseload("*")).order_by(IT.id))
+# Dropdown-Daten: nur Spalten (Rows statt ORM-Objekte, damit prozessweit cachebar)
+_ITEM_CHOICES = lambda_stmt(lambda: db.select(IT.id, IT.description).order_by(IT.description))
+# Package + (optional) zugehöriges Shipment in einem Roundtrip
+_PACKAGE_WITH_SHIPMENT = lambda_stmt(
+    lambda: db.select(PH, SH)
+      .select_from(PH)
+      .outerjoin(SL, SL.package_no == PH.id)
+      .outerjoin(SH, SH.id == SL.shipment_no)
+      .where(PH.id == bindparam("package_id"))
+)
+# Package- und Shipment-Status in einem Roundtrip (Shipment optional -> Outer Join)
+_PACKAGE_STATUSES = lambda_stmt(
+    lambda: db.select(PH.status, SH.status)
+      .select_from(PH)
+      .outerjoin(SL, SL.package_no == PH.id)
+      .outerjoin(SH, SH.id == SL.shipment_no)
+      .where(PH.id == bindparam("package_id"))
+)
+# Wie _PACKAGE_STATUSES, sperrt aber die Package-Zeile bis zum Commit (OF: nicht die nullbare Outer-Join-Seite)
+_PACKAGE_STATUSES_FOR_UPDATE = lambda_stmt(
+    lambda: db.select(PH.status, SH.status)
+      .select_from(PH)
+      .outerjoin(SL, SL.package_no == PH.id)
+      .outerjoin(SH, SH.id == SL.shipment_no)
+      .where(PH.id == bindparam("package_id"))
+      .with_for_update(of=PH)
+)
+# Package-Zeile sperren (Lock-Reihenfolge package_head -> open_reservation, s. packages_add_item)
+_LOCK_PACKAGE = lambda_stmt(
+    lambda: db.select(PH.id).where(PH.id == bindparam("package_id")).with_for_update()
+)
+# Packages eines Shipments nach line_no; nur die im Template genutzten Spalten (Bundle statt PackageHead-Objekt)
+_SHIPMENT_PACKAGES = lambda_stmt(
+    lambda: db.select(SL.line_no, Bundle("pkg", PH.id, PH.status, PH.created_at))
+      .join(PH, PH.id == SL.package_no)
+      .where(SL.shipment_no == bindparam("shipment_id"))
+      .order_by(SL.line_no.asc())
+)
+# Bundles statt ganzer ORM-Objekte: das Template liest nur diese Spalten
+_PACKAGE_LINES = lambda_stmt(
+    lambda: db.select(
+        Bundle("pl", PL.line_no, PL.quantity),
+        Bundle("it", IT.id, IT.description, IT.base_unit),
+    )
+      .join(IT, IT.id == PL.item_no)
+      .where(PL.package_no == bindparam("package_id"))
+      .order_by(IT.description.asc())
+)
+# Vollständige Neuberechnung von open_reservation (Rebuild-CLI); Quelle der Wahrheit sind die Positionen
+_OPEN_RESERVATION_TOTALS = (
+    db.select(PL.item_no, db.func.sum(PL.quantity))
+      .join(PH, PH.id == PL.package_no)
+      .join(SL, SL.package_no == PH.id)
+      .join(SH, SH.id == SL.shipment_no)
+      .where(SH.status == "open")
+      .group_by(PL.item_no)
+)
+_API_SHIPMENT_LINES = lambda_stmt(
+    lambda: db.select(SL.line_no, SL.package_no)
+      .where(SL.shipment_no == bindparam("shipment_id"))
+      .order_by(SL.line_no.asc())
+)
+_API_PACKAGE_LINES = lambda_stmt(
+    lambda: db.select(
+        Bundle("pl", PL.line_no, PL.quantity),
+        Bundle("it", IT.id, IT.description, IT.base_unit),
+    )
+      .join(IT, IT.id == PL.item_no)
+      .where(PL.package_no == bindparam("package_id"))
+      .order_by(PL.line_no.asc())
+)
+_API_SHIPMENTS = lambda_stmt(
+    lambda: db.select(
+        SH.id, SH.status, SH.shipment_number, SH.created_by, SH.created_at,
+        db.func.count(SL.package_no).label("package_count"),
+    ).join(SL, SL.shipment_no == SH.id, isouter=True)
+     .group_by(SH.id).order_by(SH.id.desc())
+)
+
+class ORJSONProvider(JSONProvider):
+    """JSON via orjson (C-Encoder, datetime nativ; naive Zeitstempel sind UTC -> '+00:00')."""
+    options = orjson.OPT_NAIVE_UTC
+
+    def dumps(self, obj, **kwargs):
+        return orjson.dumps(obj, option=self.options).decode()
+
+    def loads(self, s, **kwargs):
+        return orjson.loads(s)
+
+    def response(self, *args, **kwargs):
+        # Bytes direkt in die Response, ohne Umweg über str
+        obj = self._prepare_response_obj(args, kwargs)
+        return self._app.response_class(orjson.dumps(obj, option=self.options), mimetype="application/json")
+
+
+class SessionUser(UserMixin):
+    """Sessionunabhängiger User-Snapshot für current_user (Views brauchen nur id/username)."""
+
+    def __init__(self, id: int, username: str):
+        self.id = id
+        self.username = username
+
+
+# Vergleichshash für Logins mit unbekanntem Username: gleiche KDF-Arbeit wie bei echten Usern,
+# damit die Antwortzeit nicht verrät, ob ein Username existiert.
+_DUMMY_PASSWORD_HASH = hash_password("dummy-password")
+
+# Prozesslokaler Cache user_id -> SessionUser; User-Zeilen ändern sich selten.
+# TTLCache ist nicht threadsafe -> Zugriffe unter Lock (gthread-Worker).
+_USER_CACHE = TTLCache(maxsize=1024, ttl=60)
+_USER_CACHE_LOCK = Lock()
+
+# Sehr kurzlebiger Cache username -> Login-Row (auch Fehlschläge als None): wiederholte Versuche
+# auf denselben Namen (Doppel-Submit, Credential Stuffing) treffen die DB höchstens alle 2 s.
+_LOGIN_CACHE = TTLCache(maxsize=1024, ttl=2)
+_LOGIN_CACHE_LOCK = Lock()
+
+# Item-Stammdaten ändern sich kaum -> Dropdown-Liste kurz prozesslokal halten.
+_ITEM_CHOICES_CACHE = TTLCache(maxsize=1, ttl=60)
+_ITEM_CHOICES_LOCK = Lock()
+
+
+def _item_choices():
+    """(id, description)-Rows aller Items, sortiert; aus dem Cache oder frisch aus der DB."""
+    with _ITEM_CHOICES_LOCK:
+        rows = _ITEM_CHOICES_CACHE.get("items")
+    if rows is None:
+        rows = db.session.execute(_ITEM_CHOICES).all()
+        with _ITEM_CHOICES_LOCK:
+            _ITEM_CHOICES_CACHE["items"] = rows
+    return rows
+
+
+def _invalidate_item_choices() -> None:
+    """Nach Änderungen am Item-Stamm aufrufen (wirkt nur im eigenen Prozess; sonst greift die TTL)."""
+    with _ITEM_CHOICES_LOCK:
+        _ITEM_CHOICES_CACHE.clear()
+
+
+# Versionsschlüssel des /api/shipments-Caches; Einträge liegen unter ship:list:<version>
+_SHIPMENTS_CACHE_VERSION = b"ship:ver"
+
+# Gültigkeit eines erfolgreichen Health-DB-Pings in Sekunden
+_HEALTH_TTL = 1.0
+
+
+def _dialect_insert(model):
+    """insert() des aktiven DB-Dialekts (für ON CONFLICT / ON DUPLICATE KEY UPDATE)."""
+    name = db.session.get_bind().dialect.name
+    if name == "mysql":
+        return mysql.insert(model)
+    if name == "postgresql":
+        return postgresql.insert(model)
+    return sqlite.insert(model)
+
+
+def _upsert(stmt, index_elements, set_):
+    """Upsert für ein _dialect_insert()-Statement (ON CONFLICT DO UPDATE / MySQL ON DUPLICATE KEY UPDATE).
+
+    set_(new) liefert die Update-Werte; new sind die Werte der abgewiesenen Zeile (excluded bzw. inserted).
+    MySQL ignoriert index_elements und greift bei *jedem* Unique-Key (inkl. PK).
+    """
+    if db.session.get_bind().dialect.name == "mysql":
+        return stmt.on_duplicate_key_update(set_(stmt.inserted))
+    return stmt.on_conflict_do_update(index_elements=index_elements, set_=set_(stmt.excluded))
+
+
+def _insert_or_ignore(stmt, index_elements):
+    """Überspringt Zeilen, die mit index_elements kollidieren (ON CONFLICT DO NOTHING).
+
+    MySQL: No-op-Update der ersten Schlüsselspalte statt INSERT IGNORE (das auch andere Fehler verschluckt).
+    """
+    if db.session.get_bind().dialect.name == "mysql":
+        key = index_elements[0]
+        return stmt.on_duplicate_key_update({key: stmt.table.c[key]})
+    return stmt.on_conflict_do_nothing(index_elements=index_elements)
+
+
+# Redirect-Ziele der Schreib-Views als f-Strings statt url_for (kein Routing-Map-Build pro Request).
+# Kopplung: Pfade müssen zu den Routen "/shipments/<id>" bzw. "/packages/<id>" in create_app passen.
+def _shipment_detail_url(shipment_id: int) -> str:
+    return f"{request.script_root}/shipments/{shipment_id}"
+
+
+def _package_detail_url(package_id: int) -> str:
+    return f"{request.script_root}/packages/{package_id}"
+
+
+def _release_reservations(*criteria) -> None:
+    """Zieht die Mengen der per PL-Filter gewählten Positionen von open_reservation ab.
+
+    Vor dem Löschen von Positionen bzw. beim Versand (Shipment verlässt 'open') im selben Commit aufrufen.
+    """
+    released = (
+        db.select(db.func.coalesce(db.func.sum(PL.quantity), 0))
+          .where(PL.item_no == RV.item_no, *criteria)
+          .scalar_subquery()
+    )
+    db.session.execute(
+        db.update(RV)
+          .where(RV.item_no.in_(db.select(PL.item_no).where(*criteria)))
+          .values(qty_reserved=RV.qty_reserved - released)
+          .execution_options(synchronize_session=False)
+    )
+
+
+# do_orm_execute hängt an der (von allen Apps geteilten) Session-Klasse von db -> nur einmal pro Prozess
+# registrieren; ob er greift, entscheidet die jeweils aktive App pro Statement (debug/RAISE_ON_LAZY_LOAD,
+# beides kann sich nach create_app() noch ändern, z. B. app.run(debug=True)).
+_lazy_load_guard_installed = False
+
+
+def _raise_on_lazy_load(state) -> None:
+    """Jedes ORM-SELECT mit raiseload("*") -> versehentliche Lazy Loads (N+1) knallen sofort."""
+    if not (current_app.debug or current_app.config["RAISE_ON_LAZY_LOAD"]):
+        return
+    if not state.is_select or state.is_column_load or state.is_relationship_load:
+        return
+    if isinstance(state.statement, StatementLambdaElement):
+        state.statement = state.statement + (lambda s: s.options(raiseload("*")))
+    else:
+        state.statement = state.statement.options(raiseload("*"))
+
 
 def create_app():
     """Erzeugt und konfiguriert die Flask-App (DB, Migrations, Auth, Blueprints)."""
     app = Flask(__name__)
     app.config.from_object(Config)
+    app.json = ORJSONProvider(app)
 
     db.init_app(app)
     migrate.init_app(app, db)
+    # Mapper-Konfiguration einmal beim Start statt lazy beim ersten Query (erster Request zahlt sonst)
+    configure_mappers()
+
+    # SQLite (lokal): WAL lässt Leser parallel zu einem Schreiber laufen (Default-Journal sperrt die ganze Datei).
+    # foreign_keys=ON: SQLite prüft FKs (und damit ON DELETE CASCADE der Positionen) nur pro Verbindung.
+    # check_same_thread=False setzt SQLAlchemy 2.x für Datei-DBs mit QueuePool bereits selbst.
+    if app.config["SQLALCHEMY_DATABASE_URI"].startswith("sqlite"):
+        with app.app_context():
+            @event.listens_for(db.engine, "connect")
+            def _sqlite_pragmas(dbapi_conn, _record):
+                cur = dbapi_conn.cursor()
+                cur.execute("PRAGMA journal_mode=WAL")
+                cur.execute("PRAGMA foreign_keys=ON")
+                cur.close()
+
+    # Debug/Dev: Lazy Loads als Fehler (Listener s. _raise_on_lazy_load, einmal pro Prozess)
+    global _lazy_load_guard_installed
+    if not _lazy_load_guard_installed:
+        event.listen(db.session, "do_orm_execute", _raise_on_lazy_load)
+        _lazy_load_guard_installed = True
 
     # Flask-Login: einfache Session-basierte Auth
     login_manager.init_app(app)
     login_manager.login_view = "login"  # Redirect-Ziel bei @login_required
     login_manager.login_message_category = "info"
 
-    # Modelle importieren, damit Metadata für Alembic bekannt ist
-    from models import (
-        User, ShipmentHead, PackageHead, ShipmentLine, Item, PackageLine, Stock
-    )  # noqa: F401
+    # Optionaler Redis-Cache für /api/shipments (nur mit REDIS_URL); Fehler fallen auf die DB zurück
+    cache = redis.Redis.from_url(
+        app.config["REDIS_URL"],
+        socket_connect_timeout=app.config["REDIS_SOCKET_TIMEOUT"],
+        socket_timeout=app.config["REDIS_SOCKET_TIMEOUT"],
+    ) if app.config.get("REDIS_URL") else None
+
+    def _invalidate_shipments_cache():
+        """Nach Shipment-Mutationen Version hochzählen (O(1), alte Keys laufen per TTL aus)."""
+        if cache is None:
+            return
+        try:
+            cache.incr(_SHIPMENTS_CACHE_VERSION)
+        except redis.RedisError:
+            app.logger.warning("Could not invalidate shipments cache", exc_info=True)
+
+    # Jinja: Templates ohne auto_reload nur einmal laden/kompilieren (ungebundener Cache, ~10 Templates).
+    # auto_reload pro Aufruf prüfen: app.run(debug=True) schaltet es erst nach create_app() ein.
+    app.jinja_env.cache = {}
+    _cached_tpl = lru_cache(maxsize=None)(app.jinja_env.get_template)
+    static_pages = {}
+
+    def _tpl(name: str):
+        return app.jinja_env.get_template(name) if app.jinja_env.auto_reload else _cached_tpl(name)
+
+    def _render(name: str, **context):
+        """Wie render_template, aber mit gemerktem Template-Objekt (keine Loader-Suche pro Request).
+
+        Sendet dieselben Signale wie flask.render_template (Test-Helfer, Debug-Toolbars).
+        """
+        template = _tpl(name)
+        app.update_template_context(context)  # Context-Prozessoren (current_user, ...) weiterhin aktiv
+        before_render_template.send(app, _async_wrapper=app.ensure_sync, template=template, context=context)
+        html = template.render(context)
+        template_rendered.send(app, _async_wrapper=app.ensure_sync, template=template, context=context)
+        return html
+
+    def _static_page(name: str):
+        """Fertig gerendertes HTML für Seiten ohne Request-Daten (nur Login-Zustand variiert).
+
+        Vorgerenderte Seiten lösen keine Render-Signale aus; solange jemand template_rendered
+        abonniert hat (Tests, Toolbar), wird daher jedes Mal gerendert.
+        """
+        key = (name, current_user.is_authenticated)
+        html = static_pages.get(key)
+        if html is None or template_rendered.receivers or app.jinja_env.auto_reload:
+            html = _render(name)
+            if not app.jinja_env.auto_reload:
+                static_pages[key] = html
+        return html
 
     @login_manager.user_loader
     def load_user(user_id: str):
-        """Session-Rehydrierung eines Users via Primärschlüssel."""
-        return db.session.get(User, int(user_id))
+        """Session-Rehydrierung eines Users via Primärschlüssel (mit kurzlebigem Prozess-Cache)."""
+        uid = int(user_id)
+        with _USER_CACHE_LOCK:
+            user = _USER_CACHE.get(uid)
+        if user is not None:
+            return user
+        row = db.session.execute(_SESSION_USER, {"user_id": uid}).one_or_none()
+        if row is None:
+            return None
+        user = SessionUser(row.id, row.username)
+        with _USER_CACHE_LOCK:
+            _USER_CACHE[uid] = user
+        return user
 
     # -------- Public --------
     @app.route("/")
     def index():
         """Startseite (öffentlich)."""
-        return render_template("index.html")
+        return _static_page("index.html")
 
     # -------- Auth --------
     @app.get("/login")
@@ -57,23 +398,37 @@ def create_app():
         """Login-Formular; angemeldete Nutzer direkt zur Übersicht."""
         if current_user.is_authenticated:
             return redirect(url_for("shipments_list"))
-        return render_template("login.html")
+        return _static_page("login.html")
 
     @app.post("/login")
     def login_post():
         """Form-Login mit konstanter Fehlermeldung (keine User-Enumeration)."""
-        from models import User
         username = request.form.get("username", "").strip()
         password = request.form.get("password", "")
-        user = db.session.execute(
-            db.select(User).where(User.username == username)
-        ).scalar_one_or_none()
-
-        if not user or not user.check_password(password):
+        with _LOGIN_CACHE_LOCK:
+            cached = username in _LOGIN_CACHE
+            row = _LOGIN_CACHE.get(username)
+        if not cached:
+            row = db.session.execute(_USER_BY_NAME, {"username": username}).one_or_none()
+            with _LOGIN_CACHE_LOCK:
+                _LOGIN_CACHE[username] = row
+
+        # Bei unbekanntem User gegen den Dummy-Hash prüfen: gleiche KDF-Arbeit, Timing angeglichen
+        pw_hash = row.password_hash if row else _DUMMY_PASSWORD_HASH
+        if not verify_password(pw_hash, password) or row is None:
             # 401 signalisiert Auth-Fehler; Response ist absichtlich generisch
-            return render_template("login.html", message="Invalid username or password"), 401
+            return _render("login.html", message="Invalid username or password"), 401
+
+        # Alt-Hash (Werkzeug scrypt/pbkdf2) oder alte Argon2-Parameter -> mit dem Klartext jetzt ersetzen
+        if password_needs_rehash(row.password_hash):
+            db.session.execute(
+                db.update(User).where(User.id == row.id).values(password_hash=hash_password(password))
+            )
+            db.session.commit()
+            with _LOGIN_CACHE_LOCK:
+                _LOGIN_CACHE.pop(username, None)
 
-        login_user(user)
+        login_user(SessionUser(row.id, row.username))
         # Nur interne relative Next-URLs zulassen (einfacher Open-Redirect-Schutz)
         next_url = request.args.get("next")
         if next_url and next_url.startswith("/"):
@@ -85,29 +440,30 @@ def create_app():
         """Registrierungsformular; bestehende Sessions werden umgeleitet."""
         if current_user.is_authenticated:
             return redirect(url_for("shipments_list"))
-        return render_template("register.html")
+        return _static_page("register.html")
 
     @app.post("/register")
     def register_post():
         """Einfache Selbst-Registrierung ohne E-Mail-Verifikation (nur Demo)."""
-        from models import User
         username = request.form.get("username", "").strip()
         email = request.form.get("email", "").strip()
         password = request.form.get("password", "")
 
         if not username or not email or not password:
-            return render_template("register.html", message="All fields are required"), 400
+            return _render("register.html", message="All fields are required"), 400
 
         exists = db.session.execute(
             db.select(User).where((User.username == username) | (User.email == email))
         ).scalar_one_or_none()
         if exists:
-            return render_template("register.html", message="Username or email already in use"), 400
+            return _render("register.html", message="Username or email already in use"), 400
 
         u = User(username=username, email=email)
         u.set_password(password)
         db.session.add(u)
         db.session.commit()
+        with _LOGIN_CACHE_LOCK:
+            _LOGIN_CACHE.pop(username, None)  # evtl. gecachten Fehlschlag für den Namen verwerfen
         login_user(u)
         return redirect(url_for("shipments_list"))
 
@@ -115,167 +471,206 @@ def create_app():
     @login_required
     def logout():
         """Beendet die Session und führt auf die Startseite zurück."""
+        # Prozess-Cache-Eintrag verwerfen, damit die nächste Anmeldung frisch aus der DB lädt
+        with _USER_CACHE_LOCK:
+            _USER_CACHE.pop(current_user.id, None)
         logout_user()
         return redirect(url_for("index"))
 
     # ------------ Helpers ------------
     def _get_shipment_or_404(shipment_id: int):
         """Lädt ein Shipment oder bricht mit 404 ab (zentralisierte Lookup-Logik)."""
-        from models import ShipmentHead
         sh = db.session.get(ShipmentHead, shipment_id)
         if not sh:
             abort(404, "Shipment not found")
         return sh
 
+    def _abort_shipment_not_open(shipment_id: int, message: str):
+        """Nach bedingtem Write ohne Treffer: zurückrollen, dann 404 (gibt es nicht) bzw. 400 (nicht 'open')."""
+        db.session.rollback()
+        _get_shipment_or_404(shipment_id)
+        abort(400, message)
+
     # -------- Items (private) --------
     @app.get("/items")
     @login_required
     def list_items():
         """Item-Stammdaten (nur read-only Übersicht)."""
-        from models import Item as ItemModel
-        items = db.session.execute(db.select(ItemModel).order_by(ItemModel.id)).scalars().all()
-        return render_template("items.html", items=items)
+        items = db.session.scalars(_ITEMS_BY_ID).all()
+        return _render("items.html", items=items)
 
     # ------------ Shipments (private) ------------
     @app.get("/shipments")
     @login_required
     def shipments_list():
         """Liste aller Shipments (neuste zuerst)."""
-        from models import ShipmentHead as SH
-        rows = db.session.execute(
-            db.select(SH).order_by(SH.id.desc())
-        ).scalars().all()
-        return render_template("shipments.html", shipments=rows)
+        rows = db.session.scalars(_SHIPMENTS_LIST).all()
+        return _render("shipments.html", shipments=rows)
 
     @app.get("/shipments/new")
     @login_required
     def shipments_new():
         """Formular zur Erstellung eines Shipments."""
-        return render_template("shipment_new.html")
+        return _static_page("shipment_new.html")
 
     @app.post("/shipments/new")
     @login_required
     def shipments_create():
         """Erzeugt ein neues Shipment im Status 'open' (erstellt vom aktuellen Nutzer)."""
-        from models import ShipmentHead as SH
         sh = SH(created_by=current_user.id)  # Status-Default via Modell
         db.session.add(sh)
         db.session.commit()
-        return render_template("shipment_created.html", shipment=sh)
+        _invalidate_shipments_cache()
+        return _render("shipment_created.html", shipment=sh)
 
     @app.get("/shipments/<int:shipment_id>")
     @login_required
     def shipments_detail(shipment_id):
         """Details inkl. zugeordneter Packages (über Lines verknüpft)."""
-        from models import ShipmentLine as SL, PackageHead as PH
         sh = _get_shipment_or_404(shipment_id)
-        rows = db.session.execute(
-            db.select(SL.line_no, PH)
-              .join(PH, PH.id == SL.package_no)
-              .where(SL.shipment_no == sh.id)
-              .order_by(SL.line_no.asc())
-        ).all()
-        return render_template("shipment_detail.html", sh=sh, rows=rows)
+        rows = db.session.execute(_SHIPMENT_PACKAGES, {"shipment_id": sh.id}).all()
+        return _render("shipment_detail.html", sh=sh, rows=rows)
 
     @app.post("/shipments/<int:shipment_id>/packages/new")
     @login_required
     def shipments_add_package(shipment_id):
         """Fügt ein neues (leeres) Package dem Shipment hinzu.
 
-        Achtung: line_no wird via MAX+1 bestimmt -> bei parallelen Adds potentielles Rennen.
+        line_no kommt aus dem Zähler shipment_head.next_line: das bedingte UPDATE (WHERE status='open')
+        ist zugleich Status-Check (0 Zeilen -> 404/400) und sperrt die Shipment-Zeile bis zum Commit,
+        parallele Adds laufen dadurch seriell statt am PK (shipment_no, line_no) zu kollidieren.
         """
-        from models import ShipmentLine as SL, PackageHead as PH
-        sh = _get_shipment_or_404(shipment_id)
-        if sh.status != "open":
-            abort(400, "Shipment is not open")
-
-        # Neues Package erzeugen und direkt mit Shipment verknüpfen
-        pkg = PH(status="open", created_by=current_user.id, created_at=datetime.utcnow())
-        db.session.add(pkg)
-        db.session.flush()  # ID des Packages sicherstellen
-
-        next_line = db.session.execute(
-            db.select(db.func.coalesce(db.func.max(SL.line_no), 0) + 1)
-              .where(SL.shipment_no == sh.id)
-        ).scalar_one()
-
-        db.session.add(SL(shipment_no=sh.id, line_no=next_line, package_no=pkg.id))
+        bump = (
+            db.update(SH)
+              .where(SH.id == shipment_id, SH.status == "open")
+              .values(next_line=SH.next_line + 1)
+              .execution_options(synchronize_session=False)
+        )
+        if db.session.get_bind().dialect.update_returning:
+            next_line = db.session.execute(bump.returning(SH.next_line)).scalar_one_or_none()
+        elif db.session.execute(bump).rowcount:
+            # MySQL ohne RETURNING: Zeile ist durch das UPDATE gesperrt, der Read danach ist konsistent
+            next_line = db.session.execute(db.select(SH.next_line).where(SH.id == shipment_id)).scalar_one()
+        else:
+            next_line = None
+        if next_line is None:
+            _abort_shipment_not_open(shipment_id, "Shipment is not open")
+
+        # Neues Package per Core-INSERT erzeugen (ID kommt mit dem Insert zurück, kein extra Flush)
+        # und direkt mit Shipment verknüpfen
+        pkg_id = db.session.execute(
+            db.insert(PH).values(created_by=current_user.id)
+        ).inserted_primary_key[0]
+        db.session.execute(
+            db.insert(SL).values(shipment_no=shipment_id, line_no=next_line - 1, package_no=pkg_id)
+        )
         db.session.commit()
-        return redirect(url_for("shipments_detail", shipment_id=sh.id))
+        _invalidate_shipments_cache()
+        return redirect(_shipment_detail_url(shipment_id))
 
     @app.post("/shipments/<int:shipment_id>/ship")
     @login_required
     def shipments_ship(shipment_id):
-        """Transition 'open' -> 'shipped'; vergibt Shipment-Nummer und spiegelt Status auf Packages.
+        """Transition 'open' -> 'shipped'; vergibt Shipment-Nummer und spiegelt den Status auf Packages.
 
+        Bedingtes UPDATE (WHERE status='open') statt Lookup + Check; 0 Zeilen -> 404/400.
         Hinweis: Zeitpunkt in Nummer codiert; keine Idempotenz bei Mehrfachaufruf.
         """
-        from models import ShipmentLine as SL, PackageHead as PH
-        sh = _get_shipment_or_404(shipment_id)
-        if sh.status != "open":
-            abort(400, "Shipment already shipped")
-
-        sn = f"SN{datetime.utcnow():%Y%m%d}-{sh.id}-{datetime.utcnow():%H%M%S}"
-        sh.status = "shipped"
-        sh.shipment_number = sn
-
-        # Zugeordnete Packages massenaktualisieren
-        pkg_ids = db.session.execute(
-            db.select(SL.package_no).where(SL.shipment_no == sh.id)
-        ).scalars().all()
-        if pkg_ids:
-            db.session.execute(
-                db.update(PH).where(PH.id.in_(pkg_ids)).values(shipment_number=sn, status="shipped")
-            )
+        # Ein Zeitpunkt für Datum und Uhrzeit (zwei utcnow()-Aufrufe konnten über Mitternacht springen)
+        now = datetime.utcnow()
+        sn = f"SN{now:%Y%m%d}-{shipment_id}-{now:%H%M%S}"
+        shipped = db.session.execute(
+            db.update(SH)
+              .where(SH.id == shipment_id, SH.status == "open")
+              .values(status="shipped", shipment_number=sn)
+              .execution_options(synchronize_session=False)
+        ).rowcount
+        if not shipped:
+            _abort_shipment_not_open(shipment_id, "Shipment already shipped")
+
+        # Zugeordnete Packages in einem UPDATE mit Subquery massenaktualisieren
+        # (kein Roundtrip für die ID-Liste, keine IN-Liste mit N Parametern; Standard-SQL, auch SQLite < 3.33)
+        shipment_packages = db.select(SL.package_no).where(SL.shipment_no == shipment_id)
+        db.session.execute(
+            db.update(PH)
+              .where(PH.id.in_(shipment_packages))
+              .values(status="shipped")
+              .execution_options(synchronize_session=False)
+        )
+        # Versendete Mengen sind nicht mehr "offen" reserviert
+        _release_reservations(PL.package_no.in_(shipment_packages))
         db.session.commit()
-        return redirect(url_for("shipments_detail", shipment_id=sh.id))
+        _invalidate_shipments_cache()
+        return redirect(_shipment_detail_url(shipment_id))
 
     @app.post("/shipments/<int:shipment_id>/packages/<int:package_id>/delete")
     @login_required
     def shipments_delete_package(shipment_id, package_id):
-        """Entfernt die Verknüpfung und löscht das Package (nur solange Shipment 'open')."""
-        from models import ShipmentLine as SL, PackageHead as PH
-        sh = _get_shipment_or_404(shipment_id)
-        if sh.status != "open":
-            abort(400, "Shipment is not open")
+        """Entfernt die Verknüpfung und löscht das Package (nur solange Shipment 'open').
 
-        link = db.session.execute(
-            db.select(SL).where(SL.shipment_no == sh.id, SL.package_no == package_id)
-        ).scalar_one_or_none()
+        Shipment-Status, Verknüpfung und Package kommen aus einem Query (LEFT JOINs ab Shipment).
+        Die Shipment-Zeile bleibt bis zum Commit gesperrt: ein paralleler Ship (UPDATE shipment_head zuerst)
+        wartet, statt dass die Reservierungen des Packages doppelt freigegeben werden.
+        """
+        row = db.session.execute(
+            db.select(SH.status, SL, PH)
+              .select_from(SH)
+              .outerjoin(SL, (SL.shipment_no == SH.id) & (SL.package_no == package_id))
+              .outerjoin(PH, PH.id == SL.package_no)
+              .where(SH.id == shipment_id)
+              .with_for_update(of=SH)  # OF: nicht die nullbaren Outer-Join-Seiten (Postgres)
+        ).one_or_none()
+        if not row:
+            abort(404, "Shipment not found")
+        status, link, pkg = row
+        if status != "open":
+            abort(400, "Shipment is not open")
         if not link:
             abort(404, "Package not linked to this shipment")
 
+        if pkg:
+            # Package vor open_reservation sperren: gleiche Reihenfolge wie packages_add_item (sonst Deadlock)
+            db.session.execute(_LOCK_PACKAGE, {"package_id": package_id})
+            _release_reservations(PL.package_no == package_id)
         db.session.delete(link)
-        pkg = db.session.get(PH, package_id)
         if pkg:
             db.session.delete(pkg)
         db.session.commit()
-        return redirect(url_for("shipments_detail", shipment_id=sh.id))
+        _invalidate_shipments_cache()
+        return redirect(_shipment_detail_url(shipment_id))
 
     # ------------ Packages: detail + items (private) ------------
     @app.get("/packages/<int:package_id>")
     @login_required
     def packages_detail(package_id: int):
         """Package-Detailseite inkl. enthaltenen Items und Lock-Status."""
-        from models import PackageHead as PH, PackageLine as PL, Item as IT, ShipmentLine as SL, ShipmentHead as SH
-        pkg = db.session.get(PH, package_id)
-        if not pkg:
+        # Package samt zugehörigem Shipment (falls vorhanden, für die Lock-Berechnung) in einem Query
+        row = db.session.execute(_PACKAGE_WITH_SHIPMENT, {"package_id": package_id}).one_or_none()
+        if not row:
             abort(404, "Package not found")
+        pkg, shipment = row
 
-        # Zugehöriges Shipment (falls vorhanden) zur Lock-Berechnung laden
-        shipment_id = db.session.execute(
-            db.select(SL.shipment_no).where(SL.package_no == package_id)
-        ).scalar_one_or_none()
-        shipment = db.session.get(SH, shipment_id) if shipment_id else None
-
-        lines = db.session.execute(
-            db.select(PL, IT).join(IT, IT.id == PL.item_no).where(PL.package_no == package_id).order_by(IT.description.asc())
-        ).all()
-        all_items = db.session.execute(db.select(IT).order_by(IT.description)).scalars().all()
+        lines = db.session.execute(_PACKAGE_LINES, {"package_id": package_id}).all()
+        all_items = _item_choices()
 
         # UI-Lock, wenn Package oder Shipment nicht 'open' ist
         locked = (pkg.status != "open") or (shipment and shipment.status != "open")
-        return render_template("package_detail.html", pkg=pkg, shipment=shipment, lines=lines, all_items=all_items, locked=locked)
+        return _render("package_detail.html", pkg=pkg, shipment=shipment, lines=lines, all_items=all_items, locked=locked)
+
+    def _require_package_writable(package_id: int, lock: bool = False) -> bool:
+        """404 ohne Package, 400 wenn Package oder Parent-Shipment nicht mehr 'open' ist (ein SELECT).
+
+        Liefert True, wenn das Package in einem offenen Shipment hängt (Positionen zählen als reserviert).
+        lock=True sperrt die Package-Zeile bis zum Commit (serialisiert Schreiber desselben Packages).
+        """
+        stmt = _PACKAGE_STATUSES_FOR_UPDATE if lock else _PACKAGE_STATUSES
+        row = db.session.execute(stmt, {"package_id": package_id}).one_or_none()
+        if not row:
+            abort(404, "Package not found")
+        pkg_status, shipment_status = row
+        if pkg_status != "open" or (shipment_status is not None and shipment_status != "open"):
+            abort(400, "Package cannot be modified (shipment/pack locked)")
+        return shipment_status is not None
 
     @app.post("/packages/<int:package_id>/items")
     @login_required
@@ -283,99 +678,88 @@ def create_app():
         """Fügt ein Item in Menge qty in ein Package ein (mit Bestands-/Reservierungsprüfung).
 
         Randfälle: ungültige IDs, qty<=0, nicht vorhandenes Item/Package -> leiser Redirect.
-        Race: Reservierung basiert auf SUM(...) über 'open' Shipments; zwischen Check und Commit möglich.
+        Reservierung kommt aus open_reservation; die Stock-Zeile des Items ist zwischen Check und
+        Commit gesperrt (kurze kritische Sektion, keine Arbeit außer SQL darin).
+        Position und Reservierung werden per Upsert geschrieben (kein Select-then-Insert mehr).
+        Die Package-Zeile ist ebenfalls bis zum Commit gesperrt: parallele Adds ins selbe Package
+        laufen seriell, MAX(line_no)+1 kann nicht doppelt vergeben werden.
         """
-        from models import PackageHead as PH, PackageLine as PL, Item as IT, ShipmentLine as SL, ShipmentHead as SH, Stock as ST
-
-        pkg = db.session.get(PH, package_id)
-        if not pkg:
-            abort(404, "Package not found")
 
-        # Parent-Shipment prüfen -> schreibtauglicher Zustand?
-        shipment_id = db.session.execute(
-            db.select(SL.shipment_no).where(SL.package_no == package_id)
-        ).scalar_one_or_none()
-        shipment = db.session.get(SH, shipment_id) if shipment_id else None
-        if pkg.status != "open" or (shipment and shipment.status != "open"):
-            abort(400, "Package cannot be modified (shipment/pack locked)")
+        # Lock-Reihenfolge: package_head -> stock -> open_reservation -> package_line
+        reserves = _require_package_writable(package_id, lock=True)
 
         # Eingaben parsen/validieren
         try:
             item_id = int(request.form.get("item_id", "0"))
             qty = int(request.form.get("quantity", "0"))
         except ValueError:
-            return redirect(url_for("packages_detail", package_id=package_id))
+            return redirect(_package_detail_url(package_id))
         if qty <= 0:
-            return redirect(url_for("packages_detail", package_id=package_id))
-
-        item = db.session.get(IT, item_id)
-        if not item:
-            return redirect(url_for("packages_detail", package_id=package_id))
+            return redirect(_package_detail_url(package_id))
+
+        # Upsert der Position im Package: neue Zeile mit MAX(line_no)+1, bei bestehendem
+        # (package_no, item_no) stattdessen Menge aufaddieren – ein Statement statt SELECT + INSERT/UPDATE.
+        # MySQL greift ON DUPLICATE KEY bei *jedem* Unique-Key (auch PK) – eindeutig nur dank Package-Sperre.
+        new_line = db.select(
+            db.literal(package_id), db.func.coalesce(db.func.max(PL.line_no), 0) + 1,
+            db.literal(item_id), db.literal(qty),
+        ).where(PL.package_no == package_id)
+        stmt = _upsert(
+            _dialect_insert(PL).from_select(["package_no", "line_no", "item_no", "quantity"], new_line),
+            ["package_no", "item_no"], lambda new: {"quantity": PL.quantity + new.quantity},
+        )
+        # Reservierung des Items im selben Commit mitführen (nur für Packages in offenen Shipments)
+        reserve_stmt = _upsert(
+            _dialect_insert(RV).values(item_no=item_id, qty_reserved=qty),
+            ["item_no"], lambda new: {"qty_reserved": RV.qty_reserved + new.qty_reserved},
+        )
 
         # --- Bestandsprüfung (on hand vs. bereits reserviert in offenen Shipments) ---
-        stock_row = db.session.get(ST, item_id)
-        on_hand = stock_row.quantity_on_hand if stock_row else 0
-
-        reserved = db.session.execute(
-            db.select(db.func.coalesce(db.func.sum(PL.quantity), 0))
-            .join(PH, PH.id == PL.package_no)
-            .join(SL, SL.package_no == PH.id)
-            .join(SH, SH.id == SL.shipment_no)
-            .where(SH.status == "open", PL.item_no == item_id)
-        ).scalar_one()
-
-        if reserved + qty > on_hand:
+        # Stock-Zeile bleibt bis zum Commit gesperrt
+        try:
+            ST.reserve(db.session, item_id, qty)
+        except InsufficientStock:
+            db.session.rollback()  # Sperren sofort freigeben
             # Kein Fehlertext, nur Rückkehr zur Detailseite (UI kann Status kommunizieren)
-            return redirect(url_for("packages_detail", package_id=package_id))
+            return redirect(_package_detail_url(package_id))
 
-        # Upsert der Position im Package
-        existing = db.session.execute(
-            db.select(PL).where(PL.package_no == package_id, PL.item_no == item_id)
-        ).scalar_one_or_none()
-
-        if existing:
-            existing.quantity = existing.quantity + qty
-        else:
-            next_line = db.session.execute(
-                db.select(db.func.coalesce(db.func.max(PL.line_no), 0) + 1)
-                .where(PL.package_no == package_id)
-            ).scalar_one()
-            db.session.add(PL(package_no=package_id, line_no=next_line, item_no=item_id, quantity=qty))
-
-        db.session.commit()
-        return redirect(url_for("packages_detail", package_id=package_id))
+        try:
+            # Reservierung vor der Position sperren/schreiben: gleiche Lock-Reihenfolge wie beim
+            # Löschen (open_reservation -> package_line), sonst Deadlock bei parallelem Add/Delete
+            if reserves:
+                db.session.execute(reserve_stmt)
+            db.session.execute(stmt)
+            db.session.commit()
+        except IntegrityError:
+            # Nur noch bei Fremdeinwirkung (z. B. Item parallel gelöscht)
+            db.session.rollback()
+            abort(409, "Concurrent update, please retry")
+        return redirect(_package_detail_url(package_id))
 
     @app.post("/packages/<int:package_id>/items/<int:item_id>/delete")
     @login_required
     def packages_delete_item(package_id: int, item_id: int):
         """Entfernt eine Item-Zeile aus einem Package (nur im offenen Zustand)."""
-        from models import PackageHead as PH, PackageLine as PL, ShipmentLine as SL, ShipmentHead as SH
-        pkg = db.session.get(PH, package_id)
-        if not pkg:
-            abort(404, "Package not found")
-
-        shipment_id = db.session.execute(
-            db.select(SL.shipment_no).where(SL.package_no == package_id)
-        ).scalar_one_or_none()
-        shipment = db.session.get(SH, shipment_id) if shipment_id else None
-        if pkg.status != "open" or (shipment and shipment.status != "open"):
-            abort(400, "Package cannot be modified (shipment/pack locked)")
-
-        line = db.session.execute(
-            db.select(PL).where(PL.package_no == package_id, PL.item_no == item_id)
-        ).scalar_one_or_none()
-        if not line:
+        # Package-Zeile sperren: ein paralleler Ship (UPDATE package_head vor der Freigabe) wartet bzw. wir
+        # sehen 'shipped' -> 400; sonst würde die Position doppelt aus open_reservation abgezogen.
+        # Lock-Reihenfolge wie packages_add_item: package_head -> open_reservation -> package_line
+        if _require_package_writable(package_id, lock=True):
+            _release_reservations(PL.package_no == package_id, PL.item_no == item_id)
+
+        # Direktes DELETE; rowcount 0 -> Zeile existierte nicht
+        result = db.session.execute(
+            db.delete(PL).where(PL.package_no == package_id, PL.item_no == item_id)
+        )
+        if result.rowcount == 0:
+            db.session.rollback()
             abort(404, "Line not found")
-
-        db.session.delete(line)
         db.session.commit()
-        return redirect(url_for("packages_detail", package_id=package_id))
+        return redirect(_package_detail_url(package_id))
 
     @app.post("/packages/<int:package_id>/pack")
     @login_required
     def packages_pack(package_id: int):
         """Transition Package 'open' -> 'packed' (Vorstufe zu 'shipped')."""
-        from models import PackageHead as PH
         pkg = db.session.get(PH, package_id)
         if not pkg:
             abort(404, "Package not found")
@@ -383,75 +767,101 @@ def create_app():
             abort(400, "Package not open")
         pkg.status = "packed"
         db.session.commit()
-        return redirect(url_for("packages_detail", package_id=package_id))
+        return redirect(_package_detail_url(package_id))
 
     # ---------------------- API BLUEPRINT ----------------------
     api = Blueprint("api", __name__, url_prefix="/api")
 
+    # Key einmalig beim Aufbau lesen (Closure statt current_app-Proxy + Config-Lookup pro Request)
+    api_key = app.config.get("API_KEY", "dev-api-key").encode()
+
+    @api.before_request
     def _require_api_key():
-        """Einfacher API-Key-Check (Header/Query). Für Prod: Ratenbegrenzung & stärkere Auth erwägen."""
-        key = request.headers.get("X-API-KEY") or request.args.get("api_key")
-        if not key or key != current_app.config.get("API_KEY", "dev-api-key"):
+        """Einfacher API-Key-Check (Header/Query) für alle API-Routen. Für Prod: Ratenbegrenzung & stärkere Auth erwägen."""
+        key = (request.headers.get("X-API-KEY") or request.args.get("api_key") or "").encode()
+        # Konstante Vergleichszeit (kein Timing-Orakel über den Key-Präfix)
+        if not key or not hmac.compare_digest(key, api_key):
             return jsonify(error="Unauthorized"), 401
 
+    # Zeitpunkt (monotonic) bis zu dem der letzte erfolgreiche DB-Ping gilt; pro Prozess
+    health_ok_until = 0.0
+
     @api.get("/health")
     def api_health():
-        """Lightweight-Healthcheck inkl. trivialem DB-Ping."""
-        maybe_err = _require_api_key()
-        if maybe_err:
-            return maybe_err
-        db.session.execute(db.select(db.literal(1))).scalar_one()
+        """Lightweight-Healthcheck inkl. trivialem DB-Ping.
+
+        Ein erfolgreicher Ping gilt _HEALTH_TTL Sekunden: LB-Probes im Sekundentakt treffen die DB nur einmal.
+        """
+        nonlocal health_ok_until
+        now = time.monotonic()
+        if now >= health_ok_until:
+            db.session.execute(db.select(db.literal(1))).scalar_one()
+            health_ok_until = now + _HEALTH_TTL
         return jsonify(status="ok")
 
     @api.get("/shipments")
     def api_shipments():
-        """Aggregierte Shipment-Liste inkl. Package-Anzahl (LEFT JOIN + GROUP BY)."""
-        maybe_err = _require_api_key()
-        if maybe_err:
-            return maybe_err
-        from models import ShipmentHead as SH, ShipmentLine as SL
-        rows = db.session.execute(
-            db.select(
-                SH.id, SH.status, SH.shipment_number, SH.created_by, SH.created_at,
-                db.func.count(SL.package_no).label("package_count"),
-            ).join(SL, SL.shipment_no == SH.id, isouter=True)
-             .group_by(SH.id).order_by(SH.id.desc())
-        ).all()
-        data = [
-            {
-                "id": r.id,
-                "status": r.status,
-                "shipment_number": r.shipment_number,
-                "created_by": r.created_by,
-                "created_at": r.created_at.isoformat() if r.created_at else None,
-                "package_count": int(r.package_count or 0),
-            }
-            for r in rows
-        ]
-        return jsonify(data)
+        """Aggregierte Shipment-Liste inkl. Package-Anzahl (LEFT JOIN + GROUP BY).
+
+        Antwort wird gestreamt. Mit Redis wird das fertige JSON je Cache-Version gehalten
+        (TTL begrenzt die Staleness).
+        """
+        key = None
+        if cache is not None:
+            try:
+                key = b"ship:list:" + (cache.get(_SHIPMENTS_CACHE_VERSION) or b"0")
+                payload = cache.get(key)
+            except redis.RedisError:
+                key = payload = None
+            if payload is not None:
+                return app.response_class(payload, mimetype="application/json")
+
+        def _generate():
+            # Zeilenweise kodieren und schreiben: Speicher flach statt Row-Liste + Dict-Liste + Gesamt-Bytes
+            parts = [] if key is not None else None
+            sep = b"["
+            # yield_per als Execution-Option -> serverseitiger Cursor (PyMySQL: SSCursor), nicht nur Batch-Fetch
+            for r in db.session.execute(_API_SHIPMENTS, execution_options={"yield_per": 1000}):
+                chunk = sep + orjson.dumps(
+                    {
+                        "id": r.id,
+                        "status": r.status,
+                        "shipment_number": r.shipment_number,
+                        "created_by": r.created_by,
+                        "created_at": r.created_at,
+                        "package_count": int(r.package_count or 0),
+                    },
+                    option=ORJSONProvider.options,
+                )
+                sep = b","
+                if parts is not None:
+                    parts.append(chunk)
+                yield chunk
+            tail = b"]" if sep == b"," else b"[]"
+            yield tail
+            if parts is not None:
+                parts.append(tail)
+                try:
+                    cache.setex(key, app.config["SHIPMENTS_CACHE_TTL"], b"".join(parts))
+                except redis.RedisError:
+                    pass
+
+        return app.response_class(stream_with_context(_generate()), mimetype="application/json")
 
     @api.get("/shipments/<int:shipment_id>")
     def api_shipment_detail(shipment_id: int):
         """Detail eines Shipments inkl. zugehöriger Packages (ohne Package-Inhalte)."""
-        maybe_err = _require_api_key()
-        if maybe_err:
-            return maybe_err
-        from models import ShipmentHead as SH, ShipmentLine as SL
         sh = db.session.get(SH, shipment_id)
         if not sh:
             return jsonify(error="Not found"), 404
-        pkg_rows = db.session.execute(
-            db.select(SL.line_no, SL.package_no)
-              .where(SL.shipment_no == sh.id)
-              .order_by(SL.line_no.asc())
-        ).all()
+        pkg_rows = db.session.execute(_API_SHIPMENT_LINES, {"shipment_id": sh.id}).all()
         return jsonify(
             {
                 "id": sh.id,
                 "status": sh.status,
                 "shipment_number": sh.shipment_number,
                 "created_by": sh.created_by,
-                "created_at": sh.created_at.isoformat() if sh.created_at else None,
+                "created_at": sh.created_at,
                 "packages": [{"line_no": ln, "package_id": pid} for (ln, pid) in pkg_rows],
             }
         )
@@ -459,26 +869,17 @@ def create_app():
     @api.get("/packages/<int:package_id>")
     def api_package_detail(package_id: int):
         """Package-Detail inkl. Positionsliste (sortiert nach line_no)."""
-        maybe_err = _require_api_key()
-        if maybe_err:
-            return maybe_err
-        from models import PackageHead as PH, PackageLine as PL, Item as IT
-        pkg = db.session.get(PH, package_id)
+        pkg = db.session.get(PH, package_id, options=[undefer(PH.shipment_number)])
         if not pkg:
             return jsonify(error="Not found"), 404
-        lines = db.session.execute(
-            db.select(PL, IT)
-              .join(IT, IT.id == PL.item_no)
-              .where(PL.package_no == package_id)
-              .order_by(PL.line_no.asc())
-        ).all()
+        lines = db.session.execute(_API_PACKAGE_LINES, {"package_id": package_id}).all()
         return jsonify(
             {
                 "id": pkg.id,
                 "status": pkg.status,
                 "shipment_number": pkg.shipment_number,
                 "created_by": pkg.created_by,
-                "created_at": pkg.created_at.isoformat() if pkg.created_at else None,
+                "created_at": pkg.created_at,
                 "lines": [
                     {
                         "line_no": pl.line_no,
@@ -504,32 +905,60 @@ def register_cli(app):
     """CLI-Kommandos für Demo-Stammdaten/Bestand."""
     @app.cli.command("seed-items")
     def seed_items():
-        """Legt drei Beispiel-Items an (idempotent)."""
-        from models import Item as ItemModel
-        if db.session.execute(db.select(ItemModel)).first():
-            print("Items already exist — skipping.")
-            return
-        db.session.add_all([
-            ItemModel(description="Karton klein", base_unit="pcs"),
-            ItemModel(description="Karton gross", base_unit="pcs"),
-            ItemModel(description="Klebeband", base_unit="roll"),
+        """Legt drei Beispiel-Items an (idempotent über UNIQUE(description))."""
+        # Ein Multi-Row-INSERT; bereits vorhandene Beschreibungen werden übersprungen (kein Vorab-SELECT)
+        stmt = _dialect_insert(Item).values([
+            {"description": "Karton klein", "base_unit": "pcs"},
+            {"description": "Karton gross", "base_unit": "pcs"},
+            {"description": "Klebeband", "base_unit": "roll"},
         ])
+        db.session.execute(_insert_or_ignore(stmt, ["description"]))
         db.session.commit()
-        print("Seeded 3 items.")
+        _invalidate_item_choices()
+        print("Seeded items (existing ones skipped).")
 
     @app.cli.command("seed-stock")
     def seed_stock():
         """Baut initialen Bestand von 100 je Item auf (idempotent über PK)."""
-        from models import Item, Stock
-        items = db.session.execute(db.select(Item)).scalars().all()
-        for it in items:
-            if not db.session.get(Stock, it.id):
-                db.session.add(Stock(item_id=it.id, quantity_on_hand=100))
+        # Ein INSERT ... SELECT über alle Items; vorhandene Stock-Zeilen bleiben unverändert
+        stmt = _dialect_insert(Stock).from_select(
+            # WHERE ist nötig: SQLite parst "SELECT ... FROM item ON CONFLICT" sonst als Join-ON
+            ["item_id", "quantity_on_hand"], db.select(Item.id, db.literal(100)).where(db.true())
+        )
+        db.session.execute(_insert_or_ignore(stmt, ["item_id"]))
         db.session.commit()
         print("Seeded stock with 100 units per item.")
 
+    @app.cli.command("rebuild-reservations")
+    def rebuild_reservations():
+        """Berechnet open_reservation komplett aus den Positionen offener Shipments neu (Drift-Reparatur)."""
+        db.session.execute(db.delete(RV))
+        db.session.execute(
+            db.insert(RV).from_select(["item_no", "qty_reserved"], _OPEN_RESERVATION_TOTALS)
+        )
+        db.session.commit()
+        print("Rebuilt open reservations.")
+
+    @app.cli.command("cluster-lines")
+    def cluster_lines():
+        """Ordnet package_line/shipment_line physisch nach PK neu (nur Postgres; z. B. nächtlich per Cron).
+
+        CLUSTER sperrt die Tabelle exklusiv; online ohne Sperre:
+        pg_repack -t package_line -o package_no,line_no (analog shipment_line -o shipment_no,line_no).
+        """
+        if db.session.get_bind().dialect.name != "postgresql":
+            print("Skipped: clustering only applies to PostgreSQL.")
+            return
+        # CLUSTER ohne USING nimmt den per Migration gesetzten Index (Primärschlüssel)
+        for table in ("package_line", "shipment_line"):
+            db.session.execute(db.text(f"CLUSTER {table}"))
+            db.session.execute(db.text(f"ANALYZE {table}"))
+        db.session.commit()
+        print("Clustered line tables.")
+
 
 if __name__ == "__main__":
-    # Entwicklungsstartpunkt; debug=True nicht für Produktion geeignet.
+    # Nur Entwicklungsstartpunkt (Dev-Server, Reloader, Debugger); debug=True nicht für Produktion geeignet.
+    # Produktion: gunicorn -c gunicorn.conf.py "app:create_app()"
     app = create_app()
     app.run(host="0.0.0.0", port=5000, debug=True)
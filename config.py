@@ -17,8 +17,44 @@ class Config:
         "sqlite:///app.db"
     )
 
+    # Connection-Pool für Server-DBs (je Gunicorn-Worker): pool_size ~ gleichzeitige Requests pro
+    # Worker, Overflow fängt Spitzen ab; per ENV an workers x threads anpassen.
+    # pre_ping erkennt tote Verbindungen nach Idle, recycle kommt MySQL-wait_timeout zuvor,
+    # LIFO hält bei Lastspitzen weniger Verbindungen warm. SQLite nutzt die Flask-SQLAlchemy-Defaults.
+    SQLALCHEMY_ENGINE_OPTIONS = {} if SQLALCHEMY_DATABASE_URI.startswith("sqlite") else {
+        "pool_size": int(os.environ.get("DB_POOL_SIZE", "10")),
+        "max_overflow": int(os.environ.get("DB_MAX_OVERFLOW", "20")),
+        "pool_pre_ping": True,
+        "pool_recycle": 1800,
+        "pool_use_lifo": True,
+        # READ COMMITTED (Postgres-Default, auf MySQL explizit): jedes Statement sieht den aktuellen
+        # Commit-Stand, sodass die Reservierungs-SUM nach der Stock-Sperre parallele Adds mitzählt.
+        "isolation_level": "READ COMMITTED",
+    }
+    # LRU-Cache kompilierter Statements je Engine (alle Dialekte). 500 (SQLAlchemy-Default) reicht für die
+    # ~40 Statement-Formen der App; per ENV erhöhbar, falls die Engine-Logs "[generated in ...]" im Betrieb zeigen.
+    SQLALCHEMY_ENGINE_OPTIONS["query_cache_size"] = int(os.environ.get("DB_QUERY_CACHE_SIZE", "500"))
+
     # Deaktiviert das veraltete/teure Änderungs-Tracking-Signal von SQLAlchemy.
     SQLALCHEMY_TRACK_MODIFICATIONS = False
 
+    # Template-Reload: None = Flask-Default (nur im Debug-Modus prüfen, Prod lädt einmal); per ENV 1/0 erzwingen.
+    TEMPLATES_AUTO_RELOAD = (
+        os.environ["TEMPLATES_AUTO_RELOAD"] == "1" if "TEMPLATES_AUTO_RELOAD" in os.environ else None
+    )
+
+    # Lange Browser-Cache-Dauer für Static Files (send_file/static); weniger Requests pro Seitenaufruf.
+    SEND_FILE_MAX_AGE_DEFAULT = int(os.environ.get("SEND_FILE_MAX_AGE_DEFAULT", "31536000"))
+
+    # Lazy Loads von Relationships als Fehler melden (N+1-Regressionen); im Debug-Modus immer an.
+    RAISE_ON_LAZY_LOAD = os.environ.get("RAISE_ON_LAZY_LOAD", "0") == "1"
+
+    # Optionaler Redis-Cache für /api/shipments; ohne URL wird nicht gecacht.
+    REDIS_URL = os.environ.get("REDIS_URL")
+    # Connect-/Socket-Timeout in Sekunden: Redis down/langsam -> schnell auf die DB zurückfallen statt hängen.
+    REDIS_SOCKET_TIMEOUT = float(os.environ.get("REDIS_SOCKET_TIMEOUT", "0.25"))
+    # Maximale Staleness der gecachten Shipment-Liste in Sekunden.
+    SHIPMENTS_CACHE_TTL = int(os.environ.get("SHIPMENTS_CACHE_TTL", "30"))
+
     # Einfacher shared secret für die interne API; nur Demo — in Prod härten/ersetzen.
     API_KEY = os.environ.get("API_KEY", "dev-api-key")
@@ -0,0 +1,16 @@
+"""Flask-Extensions als Modul-Singletons (ohne App-Bindung).
+
+Eigenes Modul, damit app.py und models.py beide darauf zugreifen können,
+ohne sich gegenseitig zu importieren; Bindung an die App erfolgt in create_app().
+"""
+
+from flask_sqlalchemy import SQLAlchemy
+from flask_migrate import Migrate
+from flask_login import LoginManager
+
+# expire_on_commit=False: nach commit() keine erneuten SELECTs beim Zugriff auf gerade geschriebene
+# Objekte (z. B. im danach gerenderten Template). autoflush=False: kein impliziter Flush vor jedem
+# Query; Views schreiben explizit per commit() bzw. Core-Statement.
+db = SQLAlchemy(session_options={"expire_on_commit": False, "autoflush": False})
+migrate = Migrate()
+login_manager = LoginManager()
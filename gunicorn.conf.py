@@ -0,0 +1,18 @@
+"""Gunicorn-Konfiguration für den Produktivbetrieb.
+
+Start: gunicorn -c gunicorn.conf.py "app:create_app()"
+
+Hinweise:
+- preload_app: create_app() läuft einmal im Master; Worker erben Routing-Map, kompilierte
+  Templates und SQLAlchemy-Statement-Caches per Copy-on-Write. DB-Verbindungen entstehen erst
+  im Worker (Engine verbindet lazy).
+- workers x threads ~ gleichzeitige Requests; DB-Pool (SQLALCHEMY_ENGINE_OPTIONS) gilt je Worker.
+"""
+
+import os
+
+bind = os.environ.get("BIND", "0.0.0.0:5000")
+workers = int(os.environ.get("WEB_CONCURRENCY", "8"))
+worker_class = "gthread"
+threads = int(os.environ.get("GUNICORN_THREADS", "4"))
+preload_app = True
@@ -90,21 +90,51 @@ def run_migrations_online():
                 directives[:] = []
                 logger.info('No changes in schema detected.')
 
+    # Autogenerate ignoriert ddl_if(): Objekte, die nur für einen anderen Dialekt angelegt werden
+    # (Postgres-only Covering-Indizes in models.py), sonst als Drift melden bzw. neu generieren.
+    def include_object(object, name, type_, reflected, compare_to):
+        ddl_if = getattr(object, "_ddl_if", None)
+        if reflected or ddl_if is None or ddl_if.dialect is None:
+            return True
+        dialects = (ddl_if.dialect,) if isinstance(ddl_if.dialect, str) else ddl_if.dialect
+        return context.get_context().dialect.name in dialects
+
     conf_args = current_app.extensions['migrate'].configure_args
     if conf_args.get("process_revision_directives") is None:
         conf_args["process_revision_directives"] = process_revision_directives
+    if conf_args.get("include_object") is None:
+        conf_args["include_object"] = include_object
 
     connectable = get_engine()
 
     with connectable.connect() as connection:
+        # SQLite: die App schaltet foreign_keys pro Verbindung ein. Batch-Mode baut Tabellen per
+        # Kopie + DROP + RENAME neu; mit aktiven FKs scheitert das DROP bzw. ON DELETE CASCADE leert
+        # die Positionstabellen. Daher FKs für die Migration aus und danach explizit prüfen.
+        sqlite = connection.dialect.name == "sqlite"
+        applied = []
+        if sqlite:
+            connection.exec_driver_sql("PRAGMA foreign_keys=OFF")  # wirkt nur außerhalb einer Transaktion
+            connection.commit()  # Autobegin beenden, sonst committet begin_transaction() unten nicht
+
         context.configure(
             connection=connection,
             target_metadata=get_metadata(),
-            **conf_args
+            **{**conf_args, "on_version_apply": lambda **kw: applied.append(kw["step"])}
         )
 
         with context.begin_transaction():
             context.run_migrations()
+            if sqlite and applied:
+                # (tabelle, rowid, zieltabelle, fk-index) je verletzter Zeile; DDL ist in SQLite nicht
+                # transaktional (s. Log), der Abbruch meldet Altlasten also nur – Daten vorher bereinigen
+                violations = connection.exec_driver_sql("PRAGMA foreign_key_check").fetchall()
+                if violations:
+                    raise RuntimeError(f"Foreign key violations after migration: {violations[:10]}")
+
+        if sqlite:
+            connection.exec_driver_sql("PRAGMA foreign_keys=ON")
+            connection.commit()
 
 
 if context.is_offline_mode():
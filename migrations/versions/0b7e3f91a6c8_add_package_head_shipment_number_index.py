@@ -0,0 +1,29 @@
+"""add (partial) index on package_head.shipment_number
+
+Revision ID: 0b7e3f91a6c8
+Revises: f6a2b8d4c019
+Create Date: 2026-10-14 18:49:30.027715
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0b7e3f91a6c8'
+down_revision = 'f6a2b8d4c019'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Partiell auf Postgres/SQLite (NULL bis zum Versand); MySQL kennt keine partiellen Indizes.
+    op.create_index(
+        "ix_package_head_shipnum", "package_head", ["shipment_number"], unique=False,
+        postgresql_where=sa.text("shipment_number IS NOT NULL"),
+        sqlite_where=sa.text("shipment_number IS NOT NULL"),
+    )
+
+
+def downgrade():
+    op.drop_index("ix_package_head_shipnum", table_name="package_head")
@@ -0,0 +1,36 @@
+"""add (created_by, status) indexes to shipment_head/package_head
+
+Revision ID: 3a8c5e7f2d90
+Revises: 9f3b7d1e5c42
+Create Date: 2026-10-14 17:41:09.118452
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '3a8c5e7f2d90'
+down_revision = '9f3b7d1e5c42'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # package_line.item_no ist bereits über ix_pl_item_pkg (item_no, package_no) abgedeckt.
+    with op.batch_alter_table("shipment_head", schema=None) as batch_op:
+        batch_op.create_index("ix_shipment_head_created_by_status", ["created_by", "status"], unique=False)
+    with op.batch_alter_table("package_head", schema=None) as batch_op:
+        batch_op.create_index("ix_package_head_created_by_status", ["created_by", "status"], unique=False)
+
+
+def downgrade():
+    # MySQL hat den impliziten FK-Index auf created_by zugunsten der neuen Indizes verworfen;
+    # ohne Ersatz schlägt das DROP fehl ("needed in a foreign key constraint").
+    if op.get_bind().dialect.name == "mysql":
+        op.create_index("created_by", "shipment_head", ["created_by"])
+        op.create_index("created_by", "package_head", ["created_by"])
+    with op.batch_alter_table("package_head", schema=None) as batch_op:
+        batch_op.drop_index("ix_package_head_created_by_status")
+    with op.batch_alter_table("shipment_head", schema=None) as batch_op:
+        batch_op.drop_index("ix_shipment_head_created_by_status")
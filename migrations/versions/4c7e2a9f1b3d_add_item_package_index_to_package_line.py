@@ -0,0 +1,29 @@
+"""add (item_no, package_no) index to package_line
+
+Revision ID: 4c7e2a9f1b3d
+Revises: 2514ca1f8ad1
+Create Date: 2026-10-14 09:12:41.318204
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '4c7e2a9f1b3d'
+down_revision = '2514ca1f8ad1'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Deckt die Reservierungs-SUM (WHERE item_no = ? JOIN package_head ...) ab.
+    # shipment_line(shipment_no, line_no), package_line(package_no, line_no) und
+    # shipment_line(package_no) sind bereits über PK bzw. UNIQUE indiziert.
+    with op.batch_alter_table("package_line", schema=None) as batch_op:
+        batch_op.create_index("ix_pl_item_pkg", ["item_no", "package_no"], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table("package_line", schema=None) as batch_op:
+        batch_op.drop_index("ix_pl_item_pkg")
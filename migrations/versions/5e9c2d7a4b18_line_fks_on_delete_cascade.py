@@ -0,0 +1,52 @@
+"""line tables: foreign keys ON DELETE CASCADE
+
+Revision ID: 5e9c2d7a4b18
+Revises: 0b7e3f91a6c8
+Create Date: 2026-10-14 19:12:44.603118
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '5e9c2d7a4b18'
+down_revision = '0b7e3f91a6c8'
+branch_labels = None
+depends_on = None
+
+
+# (Tabelle, Spalte, Zieltabelle) – Positionen werden mit ihrem Kopf gelöscht
+LINE_FKS = (
+    ("shipment_line", "shipment_no", "shipment_head"),
+    ("shipment_line", "package_no", "package_head"),
+    ("package_line", "package_no", "package_head"),
+)
+
+# Die FKs des Initial-Schemas sind unbenannt (MySQL: <tabelle>_ibfk_N, Postgres: <tabelle>_<spalte>_fkey,
+# SQLite: ohne Namen). Der Name wird daher reflektiert; für SQLite vergibt Batch-Mode ihn per Konvention.
+NAMING_CONVENTION = {"fk": "fk_%(table_name)s_%(column_0_name)s_%(referred_table_name)s"}
+
+
+def _fk_name(table, column, referred):
+    for fk in sa.inspect(op.get_bind()).get_foreign_keys(table):
+        if fk["constrained_columns"] == [column] and fk["name"]:
+            return fk["name"]
+    return f"fk_{table}_{column}_{referred}"
+
+
+def _recreate_fks(ondelete):
+    for table, column, referred in LINE_FKS:
+        name = _fk_name(table, column, referred)
+        with op.batch_alter_table(table, schema=None, naming_convention=NAMING_CONVENTION) as batch_op:
+            batch_op.drop_constraint(name, type_="foreignkey")
+            batch_op.create_foreign_key(name, referred, [column], ["id"], ondelete=ondelete)
+
+
+def upgrade():
+    # Ein DELETE auf den Kopf entfernt die Positionen serverseitig (ORM: passive_deletes=True).
+    _recreate_fks("CASCADE")
+
+
+def downgrade():
+    _recreate_fks(None)
@@ -0,0 +1,30 @@
+"""server-side default 'open' for status columns
+
+Revision ID: 6c1f9a3e7d54
+Revises: d7b3e5a1c820
+Create Date: 2026-10-14 20:28:51.746203
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '6c1f9a3e7d54'
+down_revision = 'd7b3e5a1c820'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    for table in ("shipment_head", "package_head"):
+        with op.batch_alter_table(table, schema=None) as batch_op:
+            batch_op.alter_column("status", existing_type=sa.String(length=16), existing_nullable=False,
+                                  server_default="open")
+
+
+def downgrade():
+    for table in ("shipment_head", "package_head"):
+        with op.batch_alter_table(table, schema=None) as batch_op:
+            batch_op.alter_column("status", existing_type=sa.String(length=16), existing_nullable=False,
+                                  server_default=None)
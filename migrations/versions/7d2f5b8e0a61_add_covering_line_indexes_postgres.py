@@ -0,0 +1,33 @@
+"""add covering indexes on shipment_line/package_line (postgres only)
+
+Revision ID: 7d2f5b8e0a61
+Revises: 4c7e2a9f1b3d
+Create Date: 2026-10-14 15:02:18.774120
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '7d2f5b8e0a61'
+down_revision = '4c7e2a9f1b3d'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # INCLUDE gibt es nur in Postgres; MySQL/InnoDB clustert nach PK, dort ist der PK-Index schon covering.
+    bind = op.get_bind()
+    if bind.dialect.name == "postgresql":
+        op.create_index("ix_sl_ship_line", "shipment_line", ["shipment_no", "line_no"],
+                        postgresql_include=["package_no"])
+        op.create_index("ix_pl_pkg_line", "package_line", ["package_no", "line_no"],
+                        postgresql_include=["item_no", "quantity"])
+
+
+def downgrade():
+    bind = op.get_bind()
+    if bind.dialect.name == "postgresql":
+        op.drop_index("ix_pl_pkg_line", table_name="package_line")
+        op.drop_index("ix_sl_ship_line", table_name="shipment_line")
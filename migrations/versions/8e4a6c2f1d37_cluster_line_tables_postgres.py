@@ -0,0 +1,36 @@
+"""cluster package_line/shipment_line by primary key (postgres only)
+
+Revision ID: 8e4a6c2f1d37
+Revises: 6c1f9a3e7d54
+Create Date: 2026-10-14 20:51:36.918254
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '8e4a6c2f1d37'
+down_revision = '6c1f9a3e7d54'
+branch_labels = None
+depends_on = None
+
+
+# PK-Namen wie von Postgres für das (unbenannte) Initial-Schema vergeben
+CLUSTER_INDEXES = {"package_line": "package_line_pkey", "shipment_line": "shipment_line_pkey"}
+
+
+def upgrade():
+    # Positionen eines Kopfs liegen danach physisch beieinander (wenige Heap-Seiten pro Detailseite).
+    # InnoDB clustert ohnehin nach PK; SQLite: nichts zu tun. CLUSTER sperrt die Tabelle exklusiv.
+    # Die Index-Wahl bleibt gespeichert: `flask cluster-lines` ordnet später neu (online: pg_repack).
+    if op.get_bind().dialect.name == "postgresql":
+        for table, index in CLUSTER_INDEXES.items():
+            op.execute(f"CLUSTER {table} USING {index}")
+            op.execute(f"ANALYZE {table}")
+
+
+def downgrade():
+    if op.get_bind().dialect.name == "postgresql":
+        for table in CLUSTER_INDEXES:
+            op.execute(f"ALTER TABLE {table} SET WITHOUT CLUSTER")
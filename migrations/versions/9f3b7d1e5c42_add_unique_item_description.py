@@ -0,0 +1,27 @@
+"""add unique constraint on item.description
+
+Revision ID: 9f3b7d1e5c42
+Revises: e2a4c6f80b13
+Create Date: 2026-10-14 17:05:52.913604
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '9f3b7d1e5c42'
+down_revision = 'e2a4c6f80b13'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Setzt eindeutige Beschreibungen voraus; Dubletten vorher bereinigen.
+    with op.batch_alter_table("item", schema=None) as batch_op:
+        batch_op.create_unique_constraint("uq_item_description", ["description"])
+
+
+def downgrade():
+    with op.batch_alter_table("item", schema=None) as batch_op:
+        batch_op.drop_constraint("uq_item_description", type_="unique")
@@ -0,0 +1,27 @@
+"""add check constraint quantity_on_hand >= 0 on stock
+
+Revision ID: a4d8f2c6e915
+Revises: 5e9c2d7a4b18
+Create Date: 2026-10-14 19:37:05.281946
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'a4d8f2c6e915'
+down_revision = '5e9c2d7a4b18'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Setzt nicht-negative Bestände voraus; negative Zeilen vorher korrigieren.
+    with op.batch_alter_table("stock", schema=None) as batch_op:
+        batch_op.create_check_constraint("ck_stock_nonneg", "quantity_on_hand >= 0")
+
+
+def downgrade():
+    with op.batch_alter_table("stock", schema=None) as batch_op:
+        batch_op.drop_constraint("ck_stock_nonneg", type_="check")
@@ -0,0 +1,39 @@
+"""add open_reservation summary table
+
+Revision ID: b5e81c3f9d27
+Revises: 7d2f5b8e0a61
+Create Date: 2026-10-14 15:48:06.201937
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'b5e81c3f9d27'
+down_revision = '7d2f5b8e0a61'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        "open_reservation",
+        sa.Column("item_no", sa.Integer(), nullable=False),
+        sa.Column("qty_reserved", sa.Integer(), nullable=False),
+        sa.ForeignKeyConstraint(["item_no"], ["item.id"]),
+        sa.PrimaryKeyConstraint("item_no"),
+    )
+    # Bestehende Reservierungen übernehmen (gleiche Berechnung wie `flask rebuild-reservations`)
+    op.execute(
+        "INSERT INTO open_reservation (item_no, qty_reserved) "
+        "SELECT pl.item_no, SUM(pl.quantity) FROM package_line pl "
+        "JOIN package_head ph ON ph.id = pl.package_no "
+        "JOIN shipment_line sl ON sl.package_no = ph.id "
+        "JOIN shipment_head sh ON sh.id = sl.shipment_no "
+        "WHERE sh.status = 'open' GROUP BY pl.item_no"
+    )
+
+
+def downgrade():
+    op.drop_table("open_reservation")
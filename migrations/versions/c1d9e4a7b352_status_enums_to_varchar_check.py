@@ -0,0 +1,54 @@
+"""status enums -> varchar + check constraint
+
+Revision ID: c1d9e4a7b352
+Revises: 3a8c5e7f2d90
+Create Date: 2026-10-14 18:02:44.690331
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c1d9e4a7b352'
+down_revision = '3a8c5e7f2d90'
+branch_labels = None
+depends_on = None
+
+
+# Stand vor dieser Migration (siehe initial schema / d04069ca5a9c)
+SHIPMENT_ENUM = sa.Enum("open", "shipped", name="shipment_status")
+PACKAGE_ENUM = sa.Enum("open", "packed", "shipped", name="package_status")
+
+
+def upgrade():
+    with op.batch_alter_table("shipment_head", schema=None) as batch_op:
+        batch_op.alter_column("status", existing_type=SHIPMENT_ENUM, type_=sa.String(length=16),
+                              existing_nullable=False, postgresql_using="status::text")
+        batch_op.create_check_constraint("ck_shipment_status", "status IN ('open', 'shipped')")
+    with op.batch_alter_table("package_head", schema=None) as batch_op:
+        batch_op.alter_column("status", existing_type=PACKAGE_ENUM, type_=sa.String(length=16),
+                              existing_nullable=False, postgresql_using="status::text")
+        batch_op.create_check_constraint("ck_package_status", "status IN ('open', 'packed', 'shipped')")
+
+    # Postgres: die globalen Enum-Typen werden nicht mehr referenziert
+    bind = op.get_bind()
+    if bind.dialect.name == "postgresql":
+        SHIPMENT_ENUM.drop(bind, checkfirst=True)
+        PACKAGE_ENUM.drop(bind, checkfirst=True)
+
+
+def downgrade():
+    bind = op.get_bind()
+    if bind.dialect.name == "postgresql":
+        SHIPMENT_ENUM.create(bind, checkfirst=True)
+        PACKAGE_ENUM.create(bind, checkfirst=True)
+
+    with op.batch_alter_table("package_head", schema=None) as batch_op:
+        batch_op.drop_constraint("ck_package_status", type_="check")
+        batch_op.alter_column("status", existing_type=sa.String(length=16), type_=PACKAGE_ENUM,
+                              existing_nullable=False, postgresql_using="status::package_status")
+    with op.batch_alter_table("shipment_head", schema=None) as batch_op:
+        batch_op.drop_constraint("ck_shipment_status", type_="check")
+        batch_op.alter_column("status", existing_type=sa.String(length=16), type_=SHIPMENT_ENUM,
+                              existing_nullable=False, postgresql_using="status::shipment_status")
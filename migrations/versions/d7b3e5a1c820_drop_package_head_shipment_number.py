@@ -0,0 +1,40 @@
+"""drop mirrored package_head.shipment_number (derived from shipment)
+
+Revision ID: d7b3e5a1c820
+Revises: a4d8f2c6e915
+Create Date: 2026-10-14 20:04:18.570392
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'd7b3e5a1c820'
+down_revision = 'a4d8f2c6e915'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Nummer kommt jetzt per Subquery aus shipment_head (PackageHead.shipment_number als column_property).
+    op.drop_index("ix_package_head_shipnum", table_name="package_head")
+    with op.batch_alter_table("package_head", schema=None) as batch_op:
+        batch_op.drop_column("shipment_number")
+
+
+def downgrade():
+    with op.batch_alter_table("package_head", schema=None) as batch_op:
+        batch_op.add_column(sa.Column("shipment_number", sa.String(length=50), nullable=True))
+    # Kopie aus dem Shipment wiederherstellen (korrelierte Subquery, alle Dialekte)
+    op.execute(
+        "UPDATE package_head SET shipment_number = ("
+        " SELECT sh.shipment_number FROM shipment_line sl"
+        " JOIN shipment_head sh ON sh.id = sl.shipment_no"
+        " WHERE sl.package_no = package_head.id)"
+    )
+    op.create_index(
+        "ix_package_head_shipnum", "package_head", ["shipment_number"], unique=False,
+        postgresql_where=sa.text("shipment_number IS NOT NULL"),
+        sqlite_where=sa.text("shipment_number IS NOT NULL"),
+    )
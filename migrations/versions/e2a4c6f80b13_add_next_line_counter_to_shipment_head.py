@@ -0,0 +1,31 @@
+"""add next_line counter to shipment_head
+
+Revision ID: e2a4c6f80b13
+Revises: b5e81c3f9d27
+Create Date: 2026-10-14 16:21:37.540118
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e2a4c6f80b13'
+down_revision = 'b5e81c3f9d27'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table("shipment_head", schema=None) as batch_op:
+        batch_op.add_column(sa.Column("next_line", sa.Integer(), server_default="1", nullable=False))
+    # Zähler bestehender Shipments hinter die höchste vergebene line_no setzen
+    op.execute(
+        "UPDATE shipment_head SET next_line = COALESCE("
+        "(SELECT MAX(sl.line_no) FROM shipment_line sl WHERE sl.shipment_no = shipment_head.id), 0) + 1"
+    )
+
+
+def downgrade():
+    with op.batch_alter_table("shipment_head", schema=None) as batch_op:
+        batch_op.drop_column("next_line")
@@ -0,0 +1,38 @@
+"""server-side UTC default for created_at
+
+Revision ID: f6a2b8d4c019
+Revises: c1d9e4a7b352
+Create Date: 2026-10-14 18:26:13.402877
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'f6a2b8d4c019'
+down_revision = 'c1d9e4a7b352'
+branch_labels = None
+depends_on = None
+
+
+# Entspricht models.utcnow() je Dialekt (naiver UTC-Zeitstempel)
+UTC_NOW = {
+    "postgresql": "TIMEZONE('utc', CURRENT_TIMESTAMP)",
+    "mysql": "(UTC_TIMESTAMP())",
+}
+
+
+def upgrade():
+    default = sa.text(UTC_NOW.get(op.get_bind().dialect.name, "CURRENT_TIMESTAMP"))
+    for table in ("shipment_head", "package_head"):
+        with op.batch_alter_table(table, schema=None) as batch_op:
+            batch_op.alter_column("created_at", existing_type=sa.DateTime(), existing_nullable=False,
+                                  server_default=default)
+
+
+def downgrade():
+    for table in ("shipment_head", "package_head"):
+        with op.batch_alter_table(table, schema=None) as batch_op:
+            batch_op.alter_column("created_at", existing_type=sa.DateTime(), existing_nullable=False,
+                                  server_default=None)
@@ -1,21 +1,79 @@
 """ORM-Modelle für Nutzer, Shipments, Packages, Items und Bestand.
 
 Design-Notizen:
-- Status-Felder nutzen ein gemeinsames DB-Enum 'package_status' (Postgres: Typ existiert global).
-- line_no in *Line*-Tabellen ist anwendungsseitig verwaltet (Composite-PK statt autoincrement).
-- Referentielle Integrität via ForeignKeys; Löschkaskaden überwiegend über ORM-Relationships.
-- Zeitstempel in UTC.
+- Status-Felder sind VARCHAR + CHECK statt DB-Enum (kein globaler Postgres-Typ, keine ALTER-TYPE-Migrationen);
+  'open' ist zusätzlich Server-Default (INSERTs ohne Status, z. B. per Core/SQL).
+- line_no in *Line*-Tabellen ist anwendungsseitig verwaltet (Composite-PK statt autoincrement);
+  für Shipments über den Zähler shipment_head.next_line.
+- Referentielle Integrität via ForeignKeys; Positionen (*Line*) löscht die DB per ON DELETE CASCADE
+  (passive_deletes=True: kein SELECT + DELETE pro Zeile). open_reservation vorher freigeben!
+- Collections sind lazy="raise_on_sql": Views laden Spalten explizit, ein vergessenes Eager-Loading
+  (N+1) wirft sofort statt pro Zeile nachzuladen. Unit-of-Work-Kaskaden laden weiterhin normal.
+- Zeitstempel in UTC (naiv gespeichert); created_at setzt die DB per Server-Default (utcnow()).
 """
 
 from datetime import datetime
 from typing import Optional
 
-from flask_sqlalchemy import SQLAlchemy  # Hinweis: scheint ungenutzt; ggf. entfernen.
-from sqlalchemy import UniqueConstraint, CheckConstraint, Enum, ForeignKey
-from sqlalchemy.orm import relationship, Mapped, mapped_column
-from app import db
+from sqlalchemy import UniqueConstraint, CheckConstraint, ForeignKey, Index, bindparam, lambda_stmt
+from sqlalchemy.ext.associationproxy import association_proxy
+from sqlalchemy.ext.compiler import compiles
+from sqlalchemy.orm import column_property, relationship, Mapped, mapped_column
+from sqlalchemy.sql.expression import FunctionElement
+from extensions import db
 from flask_login import UserMixin
-from werkzeug.security import generate_password_hash, check_password_hash
+from argon2 import PasswordHasher
+from argon2.exceptions import InvalidHashError, VerificationError
+from werkzeug.security import check_password_hash
+
+
+# Argon2id mit OWASP-Minimalparametern (m=19 MiB, t=2, p=1): pro Login deutlich weniger RAM als die
+# Library-Defaults (64 MiB) – relevant bei workers x threads parallelen Logins.
+_PASSWORD_HASHER = PasswordHasher(time_cost=2, memory_cost=19456, parallelism=1)
+
+
+def hash_password(raw: str) -> str:
+    """Argon2id-Hash im PHC-Format ($argon2id$...)."""
+    return _PASSWORD_HASHER.hash(raw)
+
+
+def verify_password(stored: str, raw: str) -> bool:
+    """Prüft gegen Argon2id; Alt-Hashes von Werkzeug (scrypt/pbkdf2) werden weiterhin akzeptiert."""
+    if stored.startswith("$argon2"):
+        try:
+            return _PASSWORD_HASHER.verify(stored, raw)
+        except (VerificationError, InvalidHashError):
+            return False
+    return check_password_hash(stored, raw)
+
+
+def password_needs_rehash(stored: str) -> bool:
+    """True für Alt-Hashes und Argon2-Hashes mit veralteten Parametern (beim nächsten Login ersetzen)."""
+    return not stored.startswith("$argon2") or _PASSWORD_HASHER.check_needs_rehash(stored)
+
+
+class utcnow(FunctionElement):
+    """Aktueller UTC-Zeitpunkt, von der DB berechnet (naiv, passend zu den DateTime-Spalten).
+
+    func.now() liefert je nach Dialekt/Session-Zeitzone Lokalzeit, daher pro Dialekt kompiliert.
+    """
+    type = db.DateTime()
+    inherit_cache = True
+
+
+@compiles(utcnow)
+def _utcnow_default(element, compiler, **kw):
+    return "CURRENT_TIMESTAMP"  # SQLite: CURRENT_TIMESTAMP ist UTC
+
+
+@compiles(utcnow, "postgresql")
+def _utcnow_postgresql(element, compiler, **kw):
+    return "TIMEZONE('utc', CURRENT_TIMESTAMP)"
+
+
+@compiles(utcnow, "mysql")
+def _utcnow_mysql(element, compiler, **kw):
+    return "(UTC_TIMESTAMP())"  # Klammern: Ausdrucks-Default (MySQL >= 8.0.13)
 
 
 class User(db.Model, UserMixin):
@@ -25,18 +83,18 @@ class User(db.Model, UserMixin):
     id = db.Column(db.Integer, primary_key=True)
     username = db.Column(db.String(64), unique=True, nullable=False)
     email = db.Column(db.String(120), unique=True, nullable=False)
-    password_hash = db.Column(db.String(255), nullable=False)
+    password_hash = db.Column(db.String(255), nullable=False)  # Argon2id ~100 Zeichen; Platz für Alt-Hashes
 
     # Bidirektionale Beziehungen (Owner-Pattern); ORM-seitig mit Orphan-Delete.
-    shipments = relationship("ShipmentHead", back_populates="creator", cascade="all,delete-orphan")
-    packages = relationship("PackageHead", back_populates="creator", cascade="all,delete-orphan")
+    shipments = relationship("ShipmentHead", back_populates="creator", cascade="all,delete-orphan", lazy="raise_on_sql")
+    packages = relationship("PackageHead", back_populates="creator", cascade="all,delete-orphan", lazy="raise_on_sql")
 
-    # Passwort-Helfer (Werkzeug kümmert sich um Salt/Algorithmus).
+    # Passwort-Helfer (Argon2id, Salt steckt im Hash).
     def set_password(self, raw: str) -> None:
-        self.password_hash = generate_password_hash(raw)
+        self.password_hash = hash_password(raw)
 
     def check_password(self, raw: str) -> bool:
-        return check_password_hash(self.password_hash, raw)
+        return verify_password(self.password_hash, raw)
 
 
 class ShipmentHead(db.Model):
@@ -44,55 +102,58 @@ class ShipmentHead(db.Model):
     __tablename__ = "shipment_head"
 
     id: Mapped[int] = mapped_column(primary_key=True)
-    status: Mapped[str] = mapped_column(
-        Enum("open", "packed", "shipped", name="package_status"),  # geteilter Enum-Typ
-        default="open",
-        nullable=False,
-    )
+    status: Mapped[str] = mapped_column(db.String(16), default="open", server_default="open", nullable=False)
     # Geschäftsnummer: erst bei Versand gesetzt; muss dann eindeutig sein.
     shipment_number: Mapped[Optional[str]] = mapped_column(db.String(50), unique=True, nullable=True)
 
     created_by: Mapped[int] = mapped_column(ForeignKey("user.id"), nullable=False)
-    created_at: Mapped[datetime] = mapped_column(db.DateTime, default=datetime.utcnow, nullable=False)
+    created_at: Mapped[datetime] = mapped_column(db.DateTime, server_default=utcnow(), nullable=False)
+
+    # Nächste freie ShipmentLine.line_no; atomar per UPDATE hochgezählt (statt MAX(line_no)+1).
+    next_line: Mapped[int] = mapped_column(db.Integer, nullable=False, default=1, server_default="1")
+
+    __table_args__ = (
+        # "Shipments eines Users (nach Status)" + FK-Index für created_by (Postgres legt keinen automatisch an)
+        Index("ix_shipment_head_created_by_status", "created_by", "status"),
+        CheckConstraint("status IN ('open', 'shipped')", name="ck_shipment_status"),  # Lifecycle open -> shipped
+    )
 
     creator = relationship("User", back_populates="shipments")
 
     # Association-Objekt für Packages (Zeilen enthalten die Zuordnung + line_no).
-    lines = relationship("ShipmentLine", back_populates="shipment", cascade="all,delete-orphan")
-
-    # Bequemer, schreibgeschützter Zugriff auf zugehörige Packages.
-    packages = relationship(
-        "PackageHead",
-        secondary="shipment_line",
-        primaryjoin="ShipmentHead.id==ShipmentLine.shipment_no",
-        secondaryjoin="PackageHead.id==ShipmentLine.package_no",
-        viewonly=True,
+    lines = relationship(
+        "ShipmentLine", back_populates="shipment", cascade="all,delete-orphan", passive_deletes=True, lazy="raise_on_sql"
     )
 
+    # Bequemer Zugriff auf zugehörige Packages über die Lines (eine Quelle; Eager-Loading via
+    # selectinload(ShipmentHead.lines).selectinload(ShipmentLine.package)).
+    packages = association_proxy("lines", "package")
+
 
 class PackageHead(db.Model):
     """Package-Header (1:n zu PackageLine; optional 1:1 Link zu Shipment via ShipmentLine)."""
     __tablename__ = "package_head"
 
     id: Mapped[int] = mapped_column(primary_key=True)
-    status: Mapped[str] = mapped_column(
-        Enum("open", "packed", "shipped", name="package_status"),  # gleicher Enum-Typ wie oben
-        default="open",
-        nullable=False,
-    )
-    # Geschäftsnummer wird beim Versand aus Shipment gespiegelt (kein FK, reine Kopie).
-    shipment_number: Mapped[Optional[str]] = mapped_column(db.String(50), nullable=True)
+    status: Mapped[str] = mapped_column(db.String(16), default="open", server_default="open", nullable=False)
 
     created_by: Mapped[int] = mapped_column(ForeignKey("user.id"), nullable=False)
-    created_at: Mapped[datetime] = mapped_column(db.DateTime, default=datetime.utcnow, nullable=False)
+    created_at: Mapped[datetime] = mapped_column(db.DateTime, server_default=utcnow(), nullable=False)
+
+    __table_args__ = (
+        Index("ix_package_head_created_by_status", "created_by", "status"),  # analog ShipmentHead
+        CheckConstraint("status IN ('open', 'packed', 'shipped')", name="ck_package_status"),
+    )
 
     creator = relationship("User", back_populates="packages")
 
     # Ein Package darf höchstens in einem Shipment vorkommen (durch UNIQUE in ShipmentLine erzwungen).
-    shipment_link = relationship("ShipmentLine", back_populates="package", uselist=False)
+    shipment_link = relationship("ShipmentLine", back_populates="package", uselist=False, passive_deletes=True)
 
     # Positionen (Items) im Package.
-    lines = relationship("PackageLine", back_populates="package", cascade="all,delete-orphan")
+    lines = relationship(
+        "PackageLine", back_populates="package", cascade="all,delete-orphan", passive_deletes=True, lazy="raise_on_sql"
+    )
 
 
 class ShipmentLine(db.Model):
@@ -100,16 +161,33 @@ class ShipmentLine(db.Model):
     __tablename__ = "shipment_line"
 
     # Composite-PK: (shipment_no, line_no); line_no wird extern verwaltet.
-    shipment_no: Mapped[int] = mapped_column(ForeignKey("shipment_head.id"), primary_key=True)  # noqa: F821 if static check
+    shipment_no: Mapped[int] = mapped_column(ForeignKey("shipment_head.id", ondelete="CASCADE"), primary_key=True)
     line_no: Mapped[int] = mapped_column(primary_key=True)
 
     # UNIQUE stellt sicher: ein Package kann nur in genau einem Shipment verlinkt sein.
-    package_no: Mapped[int] = mapped_column(ForeignKey("package_head.id"), nullable=False, unique=True)
+    package_no: Mapped[int] = mapped_column(ForeignKey("package_head.id", ondelete="CASCADE"), nullable=False, unique=True)
+
+    # Nur Postgres: PK-Index + INCLUDE(package_no) -> Index-Only-Scan für Detail-/Ship-Abfragen.
+    # InnoDB (geclusterter PK) und SQLite decken das bereits über den PK ab -> dort kein Duplikat.
+    __table_args__ = (
+        Index("ix_sl_ship_line", "shipment_no", "line_no", postgresql_include=["package_no"]).ddl_if(dialect="postgresql"),
+    )
 
     shipment = relationship("ShipmentHead", back_populates="lines")
     package = relationship("PackageHead", back_populates="shipment_link")
 
 
+# Geschäftsnummer des Packages = die seines Shipments (keine gespiegelte Kopie mehr, die beim Versand
+# mitgeschrieben werden muss). Deferred: nur laden, wo gebraucht (undefer); PK-/UNIQUE-Lookups.
+PackageHead.shipment_number = column_property(
+    db.select(ShipmentHead.shipment_number)
+      .join(ShipmentLine, ShipmentLine.shipment_no == ShipmentHead.id)
+      .where(ShipmentLine.package_no == PackageHead.id)
+      .scalar_subquery(),
+    deferred=True,
+)
+
+
 class Item(db.Model):
     """Artikelstammdaten (Beschreibung, Basiseinheit)."""
     __tablename__ = "item"
@@ -118,7 +196,19 @@ class Item(db.Model):
     description: Mapped[str] = mapped_column(db.String(255), nullable=False)
     base_unit: Mapped[Optional[str]] = mapped_column(db.String(32), nullable=True)
 
-    lines = relationship("PackageLine", back_populates="item")
+    __table_args__ = (
+        UniqueConstraint("description", name="uq_item_description"),  # Konfliktziel für idempotentes Seeding
+    )
+
+    lines = relationship("PackageLine", back_populates="item", lazy="raise_on_sql")
+
+
+class InsufficientStock(Exception):
+    """Bestand eines Items reicht für die angefragte Menge nicht (inkl. bereits reservierter Mengen)."""
+
+    def __init__(self, item_id: int):
+        super().__init__(f"Insufficient stock for item {item_id}")
+        self.item_id = item_id
 
 
 class Stock(db.Model):
@@ -128,15 +218,56 @@ class Stock(db.Model):
     item_id: Mapped[int] = mapped_column(ForeignKey("item.id"), primary_key=True)
     quantity_on_hand: Mapped[int] = mapped_column(db.Integer, nullable=False)
 
+    __table_args__ = (
+        CheckConstraint("quantity_on_hand >= 0", name="ck_stock_nonneg"),  # Absicherung gegen Überbuchung
+    )
+
     item = relationship("Item")
 
+    @classmethod
+    def reserve(cls, session, item_id: int, qty: int) -> None:
+        """Sperrt die Stock-Zeile (FOR UPDATE) bis zum Commit und prüft on hand gegen reserviert + qty.
+
+        Wirft InsufficientStock. quantity_on_hand bleibt unverändert (Abgang = open_reservation);
+        die Reservierung schreibt der Aufrufer im selben Commit, solange die Sperre hält.
+        """
+        # Erst sperren, dann Reservierung lesen: parallele Adds desselben Items erhöhen open_reservation nur
+        # unter derselben Sperre. Bewusst zwei Statements: als Subquery im FOR-UPDATE-SELECT liefe der Read
+        # auf dem Snapshot von vor dem Warten auf die Sperre. Ohne Stock-Zeile (oder Item) ist on_hand 0.
+        on_hand = session.execute(_STOCK_FOR_UPDATE, {"item_id": item_id}).scalar_one_or_none() or 0
+        reserved = session.execute(_RESERVED_QTY, {"item_id": item_id}).scalar_one_or_none() or 0
+        if reserved + qty > on_hand:
+            raise InsufficientStock(item_id)
+
+
+class OpenReservation(db.Model):
+    """Summe der Mengen je Item in offenen Shipments (Summary-Tabelle statt 4-Wege-Join pro Add).
+
+    Wird von den Schreib-Views mitgeführt; `flask rebuild-reservations` baut sie aus den Positionen neu auf.
+    """
+    __tablename__ = "open_reservation"
+
+    item_no: Mapped[int] = mapped_column(ForeignKey("item.id"), primary_key=True)
+    qty_reserved: Mapped[int] = mapped_column(db.Integer, nullable=False, default=0)
+
+
+# Stock-Zeile eines Items sperren (SELECT ... FOR UPDATE): serialisiert parallele Adds
+# desselben Items, andere Items bleiben unberührt. SQLite ignoriert FOR UPDATE (DB-weiter Write-Lock).
+_STOCK_FOR_UPDATE = lambda_stmt(
+    lambda: db.select(Stock.quantity_on_hand).where(Stock.item_id == bindparam("item_id")).with_for_update()
+)
+# Reservierte Menge eines Items über alle Packages in offenen Shipments (Punkt-Lookup in der Summary-Tabelle)
+_RESERVED_QTY = lambda_stmt(
+    lambda: db.select(OpenReservation.qty_reserved).where(OpenReservation.item_no == bindparam("item_id"))
+)
+
 
 class PackageLine(db.Model):
     """Position in einem Package (Item, Menge, positionsweise Nummer)."""
     __tablename__ = "package_line"
 
     # Composite-PK: (package_no, line_no); line_no wird extern vergeben.
-    package_no: Mapped[int] = mapped_column(ForeignKey("package_head.id"), primary_key=True)
+    package_no: Mapped[int] = mapped_column(ForeignKey("package_head.id", ondelete="CASCADE"), primary_key=True)
     line_no: Mapped[int] = mapped_column(primary_key=True)
 
     item_no: Mapped[int] = mapped_column(ForeignKey("item.id"), nullable=False)
@@ -145,6 +276,9 @@ class PackageLine(db.Model):
     __table_args__ = (
         CheckConstraint("quantity > 0", name="ck_packageline_qty_pos"),          # keine Null-/Negativmengen
         UniqueConstraint("package_no", "item_no", name="uq_packageline_pkg_item"),  # Deduplizierung pro Package
+        Index("ix_pl_item_pkg", "item_no", "package_no"),  # Reservierungs-SUM je Item (Range-Scan statt Full Scan)
+        # Nur Postgres: Positionsliste je Package als Index-Only-Scan (s. ShipmentLine)
+        Index("ix_pl_pkg_line", "package_no", "line_no", postgresql_include=["item_no", "quantity"]).ddl_if(dialect="postgresql"),
     )
 
     package = relationship("PackageHead", back_populates="lines")